@@ -12,6 +12,7 @@ from flask_redoc import Redoc
 
 from . import config as _config
 from .data import db
+from .encoder import JSONEncoder
 from .version import __version__
 
 __all__ = ("__version__",)
@@ -20,6 +21,7 @@ __all__ = ("__version__",)
 def create_app():
     """Flask create app function."""
     app = Flask(__name__)
+    app.json_encoder = JSONEncoder
 
     app.config["SQLALCHEMY_DATABASE_URI"] = _config.SQLALCHEMY_DATABASE_URI
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = _config.SQLALCHEMY_TRACK_MODIFICATIONS
@@ -26,6 +26,8 @@ BDC_STAC_MAX_LIMIT = int(os.getenv("BDC_STAC_MAX_LIMIT", "1000"))
 BDC_STAC_TITLE = os.getenv("BDC_STAC_TITLE", "Brazil Data Cube Catalog")
 BDC_STAC_ID = os.getenv("BDC_STAC_ID", "bdc")
 BDC_STAC_ASSETS_ARGS = os.getenv("BDC_STAC_ASSETS_ARGS", None)
+BDC_STAC_CACHE_TTL = int(os.getenv("BDC_STAC_CACHE_TTL", "300"))
+BDC_STAC_COUNT_WORKERS = int(os.getenv("BDC_STAC_COUNT_WORKERS", "5"))
 BDC_AUTH_CLIENT_SECRET = os.getenv("BDC_AUTH_CLIENT_SECRET", None)
 BDC_AUTH_CLIENT_ID = os.getenv("BDC_AUTH_CLIENT_ID", None)
 BDC_AUTH_ACCESS_TOKEN_URL = os.getenv("BDC_AUTH_ACCESS_TOKEN_URL", None)
@@ -1,17 +1,21 @@
 """Data module."""
-import json
 import warnings
-from copy import deepcopy
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime as dt
-from functools import lru_cache
+from functools import lru_cache, wraps
+from threading import RLock
 
+import orjson
 from bdc_catalog.models import Band, Collection, CompositeFunction, GridRefSys, Item, Tile, Timeline
 from bdc_catalog.models.base_sql import db
-from flask_sqlalchemy import SQLAlchemy
+from cachetools import TTLCache
+from flask import current_app
+from flask_sqlalchemy import Pagination, SQLAlchemy
 from geoalchemy2.functions import GenericFunction
 from sqlalchemy import Float, and_, cast, exc, func, or_
 
-from .config import BDC_STAC_API_VERSION, BDC_STAC_FILE_ROOT, BDC_STAC_PNG_ROOT, BDC_STAC_MAX_LIMIT
+from .config import (BDC_STAC_API_VERSION, BDC_STAC_CACHE_TTL, BDC_STAC_COUNT_WORKERS, BDC_STAC_FILE_ROOT,
+                     BDC_STAC_MAX_LIMIT, BDC_STAC_PNG_ROOT)
 
 with warnings.catch_warnings():
     warnings.simplefilter("ignore", category=exc.SAWarning)
@@ -21,6 +25,57 @@ db = SQLAlchemy()
 
 session = db.create_scoped_session({"autocommit": True})
 
+# Collection metadata rarely changes, so it is cached per set of user roles.
+_catalog_cache = TTLCache(maxsize=256, ttl=BDC_STAC_CACHE_TTL)
+_collections_cache = TTLCache(maxsize=256, ttl=BDC_STAC_CACHE_TTL)
+
+
+def _cached(cache, key):
+    """Cache the results of a function, empty results are not cached.
+
+    Empty results (e.g. unknown collection ids) would otherwise evict valid entries.
+
+    :param cache: cache used to store the results
+    :param key: function that builds the cache key from the function arguments
+    """
+    lock = RLock()
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            k = key(*args, **kwargs)
+
+            try:
+                with lock:
+                    return cache[k]
+            except KeyError:
+                pass
+
+            result = func(*args, **kwargs)
+
+            if result:
+                with lock:
+                    cache[k] = result
+
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+# Runs the item count queries concurrently with the item fetch.
+_count_executor = (
+    ThreadPoolExecutor(max_workers=BDC_STAC_COUNT_WORKERS, thread_name_prefix="bdc-stac-count")
+    if BDC_STAC_COUNT_WORKERS > 0
+    else None
+)
+
+
+def _split(value):
+    """Split a comma separated string, lists are returned as is."""
+    return value.split(",") if isinstance(value, str) else value
+
 
 class ST_Extent(GenericFunction):
     """Postgis ST_Extent function."""
@@ -51,7 +106,7 @@ def get_collection_items(
     :param item_id: item identifier, defaults to None
     :type item_id: str, optional
     :param bbox: bounding box for intersection [west, north, east, south], defaults to None
-    :type bbox: list, optional
+    :type bbox: list or str, optional
     :param datetime: Single date+time, or a range ('/' seperator), formatted to RFC 3339, section 5.6.
                      Use double dots '..' for open date ranges, defaults to None. If the start or end date of an image
                      generated by a temporal composition intersects the given datetime or range it will be included in the
@@ -59,10 +114,10 @@ def get_collection_items(
     :type datetime: str, optional
     :param ids: Array of Item ids to return. All other filter parameters that further restrict the
                 number of search results are ignored, defaults to None
-    :type ids: list, optional
+    :type ids: list or str, optional
     :param collections: Array of Collection IDs to include in the search for items.
                         Only Items in one of the provided Collections will be searched, defaults to None
-    :type collections: list, optional
+    :type collections: list or str, optional
     :param intersects: Searches items by performing intersection between their geometry and provided GeoJSON geometry.
                        All GeoJSON geometry types must be supported., defaults to None
     :type intersects: dict, optional
@@ -98,10 +153,10 @@ def get_collection_items(
     ]
 
     if ids is not None:
-        where += [Item.name.in_(ids.split(","))]
+        where += [Item.name.in_(_split(ids))]
     else:
         if collections is not None:
-            where += [func.concat(Collection.name, "-", Collection.version).in_(collections.split(","))]
+            where += [func.concat(Collection.name, "-", Collection.version).in_(_split(collections))]
         elif collection_id is not None:
             where += [func.concat(Collection.name, "-", Collection.version) == collection_id]
 
@@ -117,7 +172,7 @@ def get_collection_items(
             where += [func.ST_Intersects(func.ST_GeomFromGeoJSON(str(intersects)), Item.geom)]
         elif bbox is not None:
             try:
-                split_bbox = [float(x) for x in bbox.split(",")]
+                split_bbox = [float(x) for x in _split(bbox)]
                 if split_bbox[0] == split_bbox[2] or split_bbox[1] == split_bbox[3]:
                     raise InvalidBoundingBoxError("")
 
@@ -134,6 +189,8 @@ def get_collection_items(
                     )
                 ]
             except:
+                if isinstance(bbox, (list, tuple)):
+                    bbox = ",".join(map(str, bbox))
                 raise (InvalidBoundingBoxError(f"'{bbox}' is not a valid bbox."))
 
         if datetime is not None:
@@ -159,9 +216,67 @@ def get_collection_items(
     outer = [Item.tile_id == Tile.id]
     query = session.query(*columns).outerjoin(Tile, *outer).filter(*where).order_by(Item.start_date.desc(), Item.id)
 
-    result = query.paginate(page=int(page), per_page=int(limit), error_out=False, max_per_page=BDC_STAC_MAX_LIMIT)
+    return paginate(
+        query,
+        page=int(page),
+        per_page=int(limit),
+        max_per_page=BDC_STAC_MAX_LIMIT,
+        concurrent_count=item_id is None and ids is None,
+    )
+
+
+def paginate(query, page=1, per_page=10, max_per_page=None, concurrent_count=True):
+    """Paginate a query, optionally running the total count concurrently with the fetch of the page items.
+
+    Behaves like ``flask_sqlalchemy.BaseQuery.paginate`` with ``error_out=False``. A concurrent count
+    runs on its own connection, so the total and the items come from two separate autocommit snapshots
+    and may disagree when rows are written in between.
 
-    return result
+    :param query: query to paginate
+    :param page: the page offset of results, defaults to 1
+    :param per_page: the maximum number of results of a page, defaults to 10
+    :param max_per_page: upper bound for ``per_page``, defaults to None
+    :param concurrent_count: count the results in a worker thread, defaults to True. Single item lookups
+                             and ``ids`` lookups should disable it, their count is usually known from the first page.
+    :return: the requested page.
+    :rtype: flask_sqlalchemy.Pagination
+    """
+    if max_per_page is not None:
+        per_page = min(per_page, max_per_page)
+
+    if page < 1:
+        page = 1
+
+    if per_page < 0:
+        per_page = 20
+
+    total = None
+
+    if concurrent_count and _count_executor is not None:
+        total = _count_executor.submit(_count, current_app._get_current_object(), query)
+
+    items = query.limit(per_page).offset((page - 1) * per_page).all()
+
+    if total is not None:
+        total = total.result()
+    elif page == 1 and len(items) < per_page:
+        total = len(items)  # the first page holds every result, no need to count
+    else:
+        total = query.order_by(None).count()
+
+    return Pagination(query, page, per_page, total, items)
+
+
+def _count(app, query):
+    """Count the results of a query in a worker thread.
+
+    The worker uses its own database session, which is removed once the count is done.
+    """
+    with app.app_context():
+        try:
+            return query.with_session(session()).order_by(None).count()
+        finally:
+            session.remove()
 
 
 @lru_cache()
@@ -214,6 +329,20 @@ def get_collection_eo(collection_id):
     return {"eo:gsd": eo_gsd, "eo:bands": eo_bands}
 
 
+@lru_cache()
+def get_collection_band_index(collection_id):
+    """Get the position of each band in the Collection Eletro-Optical bands.
+
+    Args:
+        collection_id (str): collection identifier
+    Returns:
+        dict: mapping of band name to its index in ``eo:bands``.
+    """
+    eo_bands = get_collection_eo(collection_id)["eo:bands"]
+
+    return {band["name"]: index for index, band in enumerate(eo_bands)}
+
+
 def get_collection_bands(collection_id):
     """Retrive a dict of bands for a given collection.
 
@@ -342,9 +471,12 @@ def get_collection_quicklook(collection_id):
     return quicklook_bands["quicklooks"] if quicklook_bands else None
 
 
+@_cached(_collections_cache, key=lambda collection_id=None, roles=[]: (collection_id, frozenset(roles)))
 def get_collections(collection_id=None, roles=[]):
     """Retrieve information of all collections or one if an id is given.
 
+    The result is cached and shared between requests, it must not be modified in place.
+
     :param collection_id: collection identifier
     :type collection_id: str
     :return: list of collections
@@ -457,6 +589,7 @@ def get_collections(collection_id=None, roles=[]):
     return collections
 
 
+@_cached(_catalog_cache, key=lambda roles=[]: frozenset(roles))
 def get_catalog(roles=[]):
     """Retrive all available collections.
 
@@ -485,13 +618,35 @@ def make_geojson(items, links, assets_kwargs=""):
 
     :param items: collection items to be formated as GeoJSON Features
     :type items: list
-    :param links: links for STAC navigation
+    :param links: links for STAC navigation (self, parent, collection and root)
     :type links: list
     :return: GeoJSON Features.
     :rtype: list
     """
-    features = list()
+    return list(iter_geojson(items, links, assets_kwargs=assets_kwargs))
+
+
+def iter_geojson(items, links, assets_kwargs=""):
+    """Generate STAC Items from collection items one at a time.
+
+    The collection metadata used by the items is loaded before any feature is generated, so database
+    errors are raised here and not in the middle of a streamed response.
+
+    :param items: collection items to be formated as GeoJSON Features
+    :type items: list
+    :param links: links for STAC navigation (self, parent, collection and root)
+    :type links: list
+    :return: GeoJSON Features.
+    :rtype: generator
+    """
+    for collection_id in {i.collection_id for i in items}:
+        get_collection_band_index(collection_id)
 
+    return _iter_geojson(items, links, assets_kwargs)
+
+
+def _iter_geojson(items, links, assets_kwargs):
+    """Generate STAC Items, see :func:`iter_geojson`."""
     for i in items:
         feature = dict()
 
@@ -501,7 +656,7 @@ def make_geojson(items, links, assets_kwargs=""):
         feature["stac_version"] = BDC_STAC_API_VERSION
         feature["stac_extensions"] = ["checksum", "commons", "eo"]
 
-        feature["geometry"] = json.loads(i.geom)
+        feature["geometry"] = orjson.loads(i.geom)
 
         bbox = list()
         if i.bbox:
@@ -510,12 +665,14 @@ def make_geojson(items, links, assets_kwargs=""):
         feature["bbox"] = bbox
 
         bands = get_collection_eo(i.collection_id)
+        band_index = get_collection_band_index(i.collection_id)
 
         properties = dict()
         properties["bdc:tiles"] = [i.tile]
 
-        properties["datetime"] = i.start.strftime("%Y-%m-%dT%H:%M:%S")
-        properties["start_datetime"] = i.start.strftime("%Y-%m-%dT%H:%M:%S")
+        start = i.start.strftime("%Y-%m-%dT%H:%M:%S")
+        properties["datetime"] = start
+        properties["start_datetime"] = start
         properties["end_datetime"] = i.end.strftime("%Y-%m-%dT%H:%M:%S")
 
         properties["created"] = i.created.strftime("%Y-%m-%dT%H:%M:%S")
@@ -529,9 +686,8 @@ def make_geojson(items, links, assets_kwargs=""):
             else:
                 value["href"] = BDC_STAC_FILE_ROOT + value["href"] + assets_kwargs
 
-            for index, band in enumerate(properties["eo:bands"], start=0):
-                if band["name"] == key:
-                    value["eo:bands"] = [index]
+            if key in band_index:
+                value["eo:bands"] = [band_index[key]]
 
         if i.meta:
             if "platform" in i.meta:
@@ -546,14 +702,15 @@ def make_geojson(items, links, assets_kwargs=""):
         feature["properties"] = properties
         feature["assets"] = i.assets
 
-        feature["links"] = deepcopy(links)
-        feature["links"][0]["href"] += i.collection + "/items/" + i.item + assets_kwargs
-        feature["links"][1]["href"] += i.collection + assets_kwargs
-        feature["links"][2]["href"] += i.collection + assets_kwargs
-
-        features.append(feature)
+        collection_suffix = i.collection + assets_kwargs
+        feature["links"] = [
+            {**links[0], "href": links[0]["href"] + i.collection + "/items/" + i.item + assets_kwargs},
+            {**links[1], "href": links[1]["href"] + collection_suffix},
+            {**links[2], "href": links[2]["href"] + collection_suffix},
+            dict(links[3]),
+        ]
 
-    return features
+        yield feature
 
 
 def create_query_filter(query):
@@ -0,0 +1,127 @@
+#
+# This file is part of bdc-stac.
+# Copyright (C) 2019 INPE.
+#
+# bdc-stac is a free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+"""JSON encoding utilities for the BDC-STAC API."""
+
+import orjson
+from flask.json import JSONEncoder as _FlaskJSONEncoder
+
+ORJSON_OPTIONS = orjson.OPT_NAIVE_UTC | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+class Link:
+    """STAC navigation link.
+
+    Used by the landing page and collection documents, item links are plain dicts, which
+    orjson serializes natively. Instances may be shared between responses and must not be
+    modified in place.
+    """
+
+    __slots__ = ("href", "rel", "type", "title")
+
+    def __init__(self, href, rel, type=None, title=None):
+        """Initialize the link.
+
+        :param href: link target
+        :param rel: relationship type
+        :param type: media type of the target, defaults to None (omitted)
+        :param title: human readable title, defaults to None (omitted)
+        """
+        self.href = href
+        self.rel = rel
+        self.type = type
+        self.title = title
+
+    def to_dict(self):
+        """Return the JSON representation of the link."""
+        link = {"href": self.href, "rel": self.rel}
+
+        if self.type is not None:
+            link["type"] = self.type
+        if self.title is not None:
+            link["title"] = self.title
+
+        return link
+
+
+_flask_default = _FlaskJSONEncoder().default
+
+
+def default(o):
+    """Return a serializable version of an object not natively supported by orjson."""
+    if isinstance(o, Link):
+        return o.to_dict()
+
+    return _flask_default(o)
+
+
+class JSONEncoder(_FlaskJSONEncoder):
+    """Flask JSON encoder backed by orjson.
+
+    Types not natively supported by orjson fall back to the Flask encoder ``default``.
+    """
+
+    def default(self, o):
+        """Return a serializable version of the given object."""
+        return default(o)
+
+    def encode(self, o):
+        """Return a JSON string representation of the given object."""
+        if self.indent is not None or self.sort_keys:
+            return super(JSONEncoder, self).encode(o)
+
+        return orjson.dumps(o, default=default, option=ORJSON_OPTIONS).decode()
+
+
+def dumps(obj):
+    """Serialize the given object to JSON bytes."""
+    return orjson.dumps(obj, default=default, option=ORJSON_OPTIONS)
+
+
+class ItemCollectionEncoder:
+    """Encoder for STAC ItemCollection documents.
+
+    The constant members of the document are serialized once, only links, context and features
+    are encoded for each response.
+    """
+
+    def __init__(self, **members):
+        """Initialize the encoder with the constant members of the document.
+
+        :param members: members placed before ``links``, ``context`` and ``features``.
+        """
+        prefix = dumps(members)[:-1]
+
+        self._prefix = prefix + (b',"links":' if members else b'"links":')
+
+    def encode(self, links, context, features):
+        """Return the ItemCollection document as JSON bytes.
+
+        :param links: navigation links of the document
+        :param context: STAC context extension object
+        :param features: list of STAC Items
+        """
+        return b"".join(
+            (self._prefix, dumps(links), b',"context":', dumps(context), b',"features":', dumps(features), b"}")
+        )
+
+    def iter_encode(self, links, context, features):
+        """Encode the ItemCollection document as chunks of JSON bytes, one per feature.
+
+        :param links: navigation links of the document
+        :param context: STAC context extension object
+        :param features: iterable of STAC Items
+        """
+        yield self._prefix + dumps(links) + b',"context":' + dumps(context) + b',"features":['
+
+        separator = b""
+
+        for feature in features:
+            yield separator + dumps(feature)
+            separator = b","
+
+        yield b"]}"
@@ -7,40 +7,258 @@
 #
 """Routes for the BDC-STAC API."""
 
-import gzip
-from copy import deepcopy
+import os
+import zlib
+from functools import lru_cache
+from urllib.parse import urlencode
 
 from bdc_auth_client.decorators import oauth2
-from flask import abort, current_app, request, send_from_directory
+from flask import Response, abort, current_app, g, request, stream_with_context
 from werkzeug.exceptions import HTTPException, InternalServerError
 from werkzeug.urls import url_encode
 
 from .config import BDC_STAC_API_VERSION, BDC_STAC_ASSETS_ARGS, BDC_STAC_BASE_URL, BDC_STAC_ID, BDC_STAC_TITLE
-from .data import InvalidBoundingBoxError, get_catalog, get_collection_items, get_collections, make_geojson, session
+from .data import InvalidBoundingBoxError, get_catalog, get_collection_items, get_collections, iter_geojson, session
+from .encoder import ItemCollectionEncoder, Link, dumps
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
 
 BASE_URL = BDC_STAC_BASE_URL
 
 
+def _load_schemas(directory):
+    """Read the JSON schemas of the given directory into a dict keyed by file name."""
+    schemas = dict()
+
+    for name in os.listdir(directory):
+        with open(os.path.join(directory, name), "rb") as f:
+            schemas[name] = f.read()
+
+    return schemas
+
+
+# JSON schemas are immutable and small, so they are loaded once and served from memory.
+_SCHEMAS = _load_schemas(os.path.join(os.path.dirname(__file__), "spec", "jsonschemas"))
+
+_ASSETS_ARGS = tuple(BDC_STAC_ASSETS_ARGS.split(",")) if BDC_STAC_ASSETS_ARGS else ()
+
+_CONFORMANCE = dumps(
+    {
+        "conformsTo": [
+            "http://www.opengis.net/spec/wfs-1/3.0/req/core",
+            "http://www.opengis.net/spec/wfs-1/3.0/req/oas30",
+            "http://www.opengis.net/spec/wfs-1/3.0/req/html",
+            "http://www.opengis.net/spec/wfs-1/3.0/req/geojson",
+        ]
+    }
+)
+
+# Static links are shared between requests and must not be modified in place.
+_LANDING_PAGE_LINKS = (
+    Link(f"{BASE_URL}/", "self", "application/json", "Link to this document"),
+    Link(f"{BASE_URL}/docs", "service-doc", "text/html", "API documentation in HTML"),
+    Link(
+        f"{BASE_URL}/conformance",
+        "conformance",
+        "application/json",
+        "OGC API conformance classes implemented by the server",
+    ),
+    Link(f"{BASE_URL}/collections", "data", "application/json", "Information about image collections"),
+    Link(f"{BASE_URL}/search", "search", "application/json", "STAC-Search endpoint"),
+)
+
+# Item links templates (self, parent, collection and root), the titled ones are used by item collections.
+_ITEM_LINKS = (
+    {"href": f"{BASE_URL}/collections/", "rel": "self"},
+    {"href": f"{BASE_URL}/collections/", "rel": "parent"},
+    {"href": f"{BASE_URL}/collections/", "rel": "collection"},
+    {"href": f"{BASE_URL}/", "rel": "root"},
+)
+
+_TITLED_ITEM_LINKS = (
+    {"href": f"{BASE_URL}/collections/", "rel": "self", "type": "application/json", "title": "Link to this document"},
+    {
+        "href": f"{BASE_URL}/collections/",
+        "rel": "parent",
+        "type": "application/json",
+        "title": "The collection related to this item",
+    },
+    {
+        "href": f"{BASE_URL}/collections/",
+        "rel": "collection",
+        "type": "application/json",
+        "title": "The collection related to this item",
+    },
+    {"href": f"{BASE_URL}/", "rel": "root", "type": "application/json", "title": "API landing page (root catalog)"},
+)
+
+_ITEMS_ENCODER = ItemCollectionEncoder(
+    stac_version="0.9.0", stac_extensions=["checksum", "commons", "context", "eo"], type="FeatureCollection"
+)
+
+_SEARCH_ENCODER = ItemCollectionEncoder(type="FeatureCollection")
+
+
 def get_assets_kwargs(access_token):
-    """Generates `assets_kwargs` based on `BDC_STAC_ASSETS_ARGS` environment variable."""
-    assets_kwargs = ""
+    """Generates `assets_kwargs` based on `BDC_STAC_ASSETS_ARGS` environment variable.
 
-    if BDC_STAC_ASSETS_ARGS:
-        assets_kwargs = {arg: request.args.get(arg) \
-                            for arg in BDC_STAC_ASSETS_ARGS.split(",") \
-                                if request.args.get(arg) is not None}
+    The result is memoized in ``flask.g`` for the current request.
+    """
+    if "assets_kwargs" not in g:
+        g.assets_kwargs = _make_assets_kwargs(access_token)
 
-        if access_token:
-            assets_kwargs["access_token"] = access_token
+    return g.assets_kwargs
 
-        if not assets_kwargs:
-            return ""
 
-        assets_kwargs = "?" + url_encode(assets_kwargs) if url_encode(assets_kwargs) else ""
+def _make_assets_kwargs(access_token):
+    """Build the `assets_kwargs` query string for the current request."""
+    if not _ASSETS_ARGS:
+        return ""
+
+    args = tuple((arg, request.args.get(arg)) for arg in _ASSETS_ARGS if request.args.get(arg) is not None)
+    assets_kwargs = _encode_assets_kwargs(args)
+
+    # The access token is left out of the cache key, so tokens are not retained in memory.
+    if access_token:
+        token = url_encode({"access_token": access_token})
+        assets_kwargs = f"{assets_kwargs}&{token}" if assets_kwargs else f"?{token}"
 
     return assets_kwargs
 
 
+@lru_cache(maxsize=1024)
+def _encode_assets_kwargs(args):
+    """Encode the `assets_kwargs` query string.
+
+    :param args: tuple of (name, value) pairs taken from the request arguments
+    """
+    encoded = url_encode(dict(args))
+
+    return f"?{encoded}" if encoded else ""
+
+
+def _collection_links(collection_id, assets_kwargs):
+    """Build the navigation links of a collection.
+
+    :param collection_id: identifier (name) of a specific collection
+    :param assets_kwargs: query string appended to each link
+    """
+    prefix = f"{BASE_URL}/collections/{collection_id}"
+
+    return [
+        Link(prefix + assets_kwargs, "self", "application/json", "Link to this document"),
+        Link(
+            prefix + "/items" + assets_kwargs, "items", "application/json", f"Items of the collection {collection_id}"
+        ),
+        Link(BASE_URL + "/collections" + assets_kwargs, "parent", "application/json", "Link to catalog collections"),
+        Link(BASE_URL + "/" + assets_kwargs, "root", "application/json", "API landing page (root catalog)"),
+    ]
+
+
+def _page_href(path, page=None):
+    """Build the link to a page of results keeping the current query string.
+
+    :param path: path of the paginated resource
+    :param page: page number that replaces the ``page`` argument, defaults to None (arguments are kept as is)
+    """
+    args = request.args.items(multi=True)
+
+    if page is not None:
+        args = [(key, value) for key, value in args if key != "page"]
+        args.append(("page", page))
+
+    query_string = urlencode(list(args))
+
+    return f"{BASE_URL}{path}?{query_string}" if query_string else f"{BASE_URL}{path}"
+
+
+def _gzip_compressor():
+    """Create a gzip compressor."""
+    return zlib.compressobj(4, zlib.DEFLATED, 31)
+
+
+def _zstd_compressor():
+    """Create a zstandard compressor."""
+    # ZstdCompressor instances are not thread safe, so a new one is created per response.
+    return zstandard.ZstdCompressor(level=3).compressobj()
+
+
+class _BrotliCompressor:
+    """Brotli compressor exposing the same interface as ``zlib.compressobj``."""
+
+    __slots__ = ("_compressor",)
+
+    def __init__(self):
+        """Create a brotli compressor tuned for UTF-8 text."""
+        self._compressor = brotli.Compressor(quality=4, mode=brotli.MODE_TEXT)
+
+    def compress(self, data):
+        """Compress a chunk of data."""
+        return self._compressor.process(data)
+
+    def flush(self):
+        """Finish the stream and return the remaining compressed data."""
+        return self._compressor.finish()
+
+
+_COMPRESSORS = {"gzip": _gzip_compressor}
+
+if brotli is not None:
+    _COMPRESSORS["br"] = _BrotliCompressor
+
+if zstandard is not None:
+    _COMPRESSORS["zstd"] = _zstd_compressor
+
+# Supported encodings in order of preference.
+_ENCODINGS = tuple(encoding for encoding in ("br", "zstd", "gzip") if encoding in _COMPRESSORS)
+
+# Brotli only pays off on larger payloads, smaller ones use the next accepted encoding.
+_BROTLI_MIN_SIZE = 10 * 1024
+
+
+def _select_encoding(accept_encodings, content_length=None):
+    """Select the preferred content encoding accepted by the client.
+
+    :param accept_encodings: parsed ``Accept-Encoding`` request header.
+    :param content_length: size of the response body, defaults to None (unknown size).
+    :return: the encoding name or ``None`` if the client does not accept any supported encoding.
+    """
+    for encoding in _ENCODINGS:
+        if encoding == "br" and content_length is not None and content_length < _BROTLI_MIN_SIZE:
+            continue
+
+        if accept_encodings.quality(encoding) > 0:
+            return encoding
+
+    return None
+
+
+def _compress(encoding, data):
+    """Compress data with the given content encoding."""
+    compressor = _COMPRESSORS[encoding]()
+    return compressor.compress(data) + compressor.flush()
+
+
+def _compress_stream(encoding, chunks):
+    """Compress an iterable of chunks with the given content encoding."""
+    compressor = _COMPRESSORS[encoding]()
+
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+
+    yield compressor.flush()
+
+
 @current_app.teardown_appcontext
 def teardown_appcontext(exceptions=None):
     """Teardown appcontext."""
@@ -54,23 +272,40 @@ def after_request(response):
     response.headers.add("Access-Control-Allow-Headers", "Content-Type")
     response.headers.add("Access-Control-Allow-Methods", "GET, POST")
 
-    accept_encoding = request.headers.get("Accept-Encoding", "")
-
     if (
         response.status_code < 200
         or response.status_code >= 300
         or response.direct_passthrough
-        or len(response.get_data()) < 500
-        or "gzip" not in accept_encoding.lower()
-        or "Content-Encoding" in response.headers
+        or response.headers.get("Content-Encoding") is not None
+        or not request.headers.get("Accept-Encoding")
     ):
         return response
 
-    compressed_data = gzip.compress(response.get_data(), compresslevel=4)
+    content_length = None
+
+    # calculate_content_length would buffer a streamed response, its length is unknown until it is sent.
+    if not response.is_streamed:
+        content_length = response.calculate_content_length()
 
-    response.set_data(compressed_data)
-    response.headers["Content-Encoding"] = "gzip"
-    response.headers["Content-Length"] = len(response.get_data())
+        if content_length < 500:
+            return response
+
+    encoding = _select_encoding(request.accept_encodings, content_length)
+
+    if encoding is None:
+        return response
+
+    if response.is_streamed:
+        app_iter = response.response
+        response.response = _compress_stream(encoding, response.iter_encoded())
+
+        if hasattr(app_iter, "close"):
+            response.call_on_close(app_iter.close)
+    else:
+        response.set_data(_compress(encoding, response.get_data()))
+
+    response.headers["Content-Encoding"] = encoding
+    response.vary.add("Accept-Encoding")
 
     return response
 
@@ -78,14 +313,7 @@ def after_request(response):
 @current_app.route("/conformance", methods=["GET"])
 def conformance():
     """Information about standards that this API conforms to."""
-    return {
-        "conformsTo": [
-            "http://www.opengis.net/spec/wfs-1/3.0/req/core",
-            "http://www.opengis.net/spec/wfs-1/3.0/req/oas30",
-            "http://www.opengis.net/spec/wfs-1/3.0/req/html",
-            "http://www.opengis.net/spec/wfs-1/3.0/req/geojson",
-        ]
-    }
+    return Response(_CONFORMANCE, mimetype="application/json")
 
 
 @current_app.route("/", methods=["GET"])
@@ -93,39 +321,18 @@ def conformance():
 def index(roles=[], access_token=""):
     """Landing page of this API."""
 
+    assets_kwargs = get_assets_kwargs(access_token)
+
     collections = get_catalog(roles=roles)
     catalog = dict()
     catalog["description"] = BDC_STAC_TITLE
     catalog["id"] = BDC_STAC_ID
     catalog["stac_version"] = BDC_STAC_API_VERSION
-    links = list()
-    links += [
-        {"href": f"{BASE_URL}/", "rel": "self", "type": "application/json", "title": "Link to this document"},
-        {"href": f"{BASE_URL}/docs", "rel": "service-doc", "type": "text/html", "title": "API documentation in HTML"},
-        {
-            "href": f"{BASE_URL}/conformance",
-            "rel": "conformance",
-            "type": "application/json",
-            "title": "OGC API conformance classes implemented by the server",
-        },
-        {
-            "href": f"{BASE_URL}/collections",
-            "rel": "data",
-            "type": "application/json",
-            "title": "Information about image collections",
-        },
-        {"href": f"{BASE_URL}/search", "rel": "search", "type": "application/json", "title": "STAC-Search endpoint"},
-    ]
+    links = list(_LANDING_PAGE_LINKS)
 
     for collection in collections:
-        links.append(
-            {
-                "href": f"{BASE_URL}/collections/{collection.name}{get_assets_kwargs(access_token)}",
-                "rel": "child",
-                "type": "application/json",
-                "title": collection.title,
-            }
-        )
+        href = f"{BASE_URL}/collections/{collection.name}{assets_kwargs}"
+        links.append(Link(href, "child", "application/json", collection.title))
 
     catalog["links"] = links
 
@@ -140,37 +347,13 @@ def root(roles=[], access_token=""):
 
     collections = get_collections(roles=roles)
     response = dict()
+    response_collections = list()
 
     for collection in collections:
-        links = [
-            {
-                "href": f"{BASE_URL}/collections/{collection['id']}{assets_kwargs}",
-                "rel": "self",
-                "type": "application/json",
-                "title": "Link to this document",
-            },
-            {
-                "href": f"{BASE_URL}/collections/{collection['id']}/items{assets_kwargs}",
-                "rel": "items",
-                "type": "application/json",
-                "title": f"Items of the collection {collection['id']}",
-            },
-            {
-                "href": f"{BASE_URL}/collections{assets_kwargs}",
-                "rel": "parent",
-                "type": "application/json",
-                "title": "Link to catalog collections",
-            },
-            {
-                "href": f"{BASE_URL}/{assets_kwargs}",
-                "rel": "root",
-                "type": "application/json",
-                "title": "API landing page (root catalog)",
-            },
-        ]
-        collection["links"] = links
+        links = _collection_links(collection["id"], assets_kwargs)
+        response_collections.append({**collection, "links": links})
 
-    response["collections"] = collections
+    response["collections"] = response_collections
 
     return response
 
@@ -191,36 +374,9 @@ def collections_id(collection_id, roles=[], access_token=""):
 
     collection = collection[0]
 
-    links = [
-        {
-            "href": f"{BASE_URL}/collections/{collection['id']}{assets_kwargs}",
-            "rel": "self",
-            "type": "application/json",
-            "title": "Link to this document",
-        },
-        {
-            "href": f"{BASE_URL}/collections/{collection['id']}/items{assets_kwargs}",
-            "rel": "items",
-            "type": "application/json",
-            "title": f"Items of the collection {collection['id']}",
-        },
-        {
-            "href": f"{BASE_URL}/collections{assets_kwargs}",
-            "rel": "parent",
-            "type": "application/json",
-            "title": "Link to catalog collections",
-        },
-        {
-            "href": f"{BASE_URL}/{assets_kwargs}",
-            "rel": "root",
-            "type": "application/json",
-            "title": "API landing page (root catalog)",
-        },
-    ]
-
-    collection["links"] = links
+    links = _collection_links(collection["id"], assets_kwargs)
 
-    return collection
+    return {**collection, "links": links}
 
 
 @current_app.route("/collections/<collection_id>/items", methods=["GET"])
@@ -232,64 +388,22 @@ def collection_items(collection_id, roles=[], access_token=""):
     """
     items = get_collection_items(collection_id=collection_id, roles=roles, **request.args.to_dict())
 
-    links = [
-        {
-            "href": f"{BASE_URL}/collections/",
-            "rel": "self",
-            "type": "application/json",
-            "title": "Link to this document",
-        },
-        {
-            "href": f"{BASE_URL}/collections/",
-            "rel": "parent",
-            "type": "application/json",
-            "title": "The collection related to this item",
-        },
-        {
-            "href": f"{BASE_URL}/collections/",
-            "rel": "collection",
-            "type": "application/json",
-            "title": "The collection related to this item",
-        },
-        {"href": f"{BASE_URL}/", "rel": "root", "type": "application/json", "title": "API landing page (root catalog)"},
-    ]
+    context = {"matched": items.total, "returned": len(items.items), "limit": items.per_page}
 
-    gjson = dict()
-    gjson["stac_version"] = "0.9.0"
-    gjson["stac_extensions"] = ["checksum", "commons", "context", "eo"]
-    gjson["type"] = "FeatureCollection"
-
-    features = make_geojson(items.items, links, assets_kwargs=get_assets_kwargs(access_token))
-
-    gjson["links"] = []
-
-    context = dict()
-    context["matched"] = items.total
-    context["returned"] = len(items.items)
-    context["limit"] = items.per_page
-    gjson["context"] = context
-
-    args = request.args.copy()
+    links = []
+    items_path = f"/collections/{collection_id}/items"
 
     if items.has_next:
-        args["page"] = items.next_num
-        gjson["links"].append(
-            {
-                "href": f"{BASE_URL}/collections/{collection_id}/items{f'?{url_encode(args)}' if len(args) > 0 else ''}",
-                "rel": "next",
-            }
-        )
+        links.append({"href": _page_href(items_path, items.next_num), "rel": "next"})
     if items.has_prev:
-        args["page"] = items.prev_num
-        gjson["links"].append(
-            {
-                "href": f"{BASE_URL}/collections/{collection_id}/items{f'?{url_encode(args)}' if len(args) > 0 else ''}",
-                "rel": "prev",
-            }
-        )
+        links.append({"href": _page_href(items_path, items.prev_num), "rel": "prev"})
+
+    # Features are encoded while the response is sent, so the whole document is never held in memory.
+    features = iter_geojson(items.items, _TITLED_ITEM_LINKS, assets_kwargs=get_assets_kwargs(access_token))
 
-    gjson["features"] = features
-    return gjson
+    return Response(
+        stream_with_context(_ITEMS_ENCODER.iter_encode(links, context, features)), mimetype="application/json"
+    )
 
 
 @current_app.route("/collections/<collection_id>/items/<item_id>", methods=["GET"])
@@ -301,17 +415,11 @@ def items_id(collection_id, item_id, roles=[], access_token=""):
     :param item_id: identifier (name) of a specific item
     """
     item = get_collection_items(collection_id=collection_id, roles=roles, item_id=item_id)
-    links = [
-        {"href": f"{BASE_URL}/collections/", "rel": "self"},
-        {"href": f"{BASE_URL}/collections/", "rel": "parent"},
-        {"href": f"{BASE_URL}/collections/", "rel": "collection"},
-        {"href": f"{BASE_URL}/", "rel": "root"},
-    ]
 
-    gjson = make_geojson(item.items, links, assets_kwargs=get_assets_kwargs(access_token))
+    feature = next(iter_geojson(item.items, _ITEM_LINKS, assets_kwargs=get_assets_kwargs(access_token)), None)
 
-    if len(gjson) > 0:
-        return gjson[0]
+    if feature is not None:
+        return feature
 
     abort(404, f"Invalid item id '{item_id}' for collection '{collection_id}'")
 
@@ -326,20 +434,11 @@ def stac_search(roles=[], access_token=""):
             request_json = request.get_json()
 
             bbox = request_json.get("bbox", None)
-            if bbox is not None:
-                bbox = ",".join([str(x) for x in bbox])
-
             datetime = request_json.get("datetime", None)
-
             ids = request_json.get("ids", None)
-            if ids is not None:
-                ids = ",".join([x for x in ids])
-
             intersects = request_json.get("intersects", None)
             query = request_json.get("query", None)
             collections = request_json.get("collections", None)
-            if collections is not None:
-                collections = ",".join([x for x in collections])
 
             page = int(request_json.get("page", 1))
             limit = int(request_json.get("limit", 10))
@@ -366,66 +465,48 @@ def stac_search(roles=[], access_token=""):
         query=query,
     )
 
-    links = [
-        {"href": f"{BASE_URL}/collections/", "rel": "self"},
-        {"href": f"{BASE_URL}/collections/", "rel": "parent"},
-        {"href": f"{BASE_URL}/collections/", "rel": "collection"},
-        {"href": f"{BASE_URL}/", "rel": "root"},
-    ]
-
-    gjson = dict()
-    gjson["type"] = "FeatureCollection"
-
-    features = make_geojson(items.items, links, assets_kwargs=get_assets_kwargs(access_token))
+    features = list(iter_geojson(items.items, _ITEM_LINKS, assets_kwargs=get_assets_kwargs(access_token)))
 
-    gjson["links"] = []
-    context = dict()
-    context["matched"] = items.total
-    context["returned"] = len(items.items)
-    gjson["context"] = context
+    context = {"matched": items.total, "returned": len(items.items)}
 
-    args = request.args.copy()
+    links = []
 
     if items.has_next:
-        if request.method == "GET":
-            args["page"] = items.next_num
-
         next_links = {
-            "href": f"{BASE_URL}/search{f'?{url_encode(args)}' if len(args) > 0 else ''}",
+            "href": _page_href("/search", items.next_num if request.method == "GET" else None),
             "rel": "next",
         }
 
         if request.method == "POST":
-            next_links["body"] = deepcopy(request_json)
-            next_links["body"]["page"] = items.next_num
+            next_links["body"] = {**request_json, "page": items.next_num}
             next_links["method"] = "POST"
             next_links["merge"] = True
-        gjson["links"].append(next_links)
+        links.append(next_links)
     if items.has_prev:
-        if request.method == "GET":
-            args["page"] = items.prev_num
-
         prev_links = {
-            "href": f"{BASE_URL}/search{f'?{url_encode(args)}' if len(args) > 0 else ''}",
+            "href": _page_href("/search", items.prev_num if request.method == "GET" else None),
             "rel": "prev",
         }
 
         if request.method == "POST":
-            prev_links["body"] = deepcopy(request_json)
-            prev_links["body"]["page"] = items.prev_num
+            prev_links["body"] = {**request_json, "page": items.prev_num}
             prev_links["method"] = "POST"
             prev_links["merge"] = True
-        gjson["links"].append(prev_links)
-
-    gjson["features"] = features
+        links.append(prev_links)
 
-    return gjson
+    return Response(_SEARCH_ENCODER.encode(links, context, features), mimetype="application/json")
 
 
 @current_app.route("/schemas/<string:schema_name>")
 def list_schema(schema_name):
     """Return jsonschemas."""
-    return send_from_directory("spec/jsonschemas", schema_name)
+    if schema_name not in _SCHEMAS:
+        abort(404, f"Schema '{schema_name}' not found.")
+
+    response = Response(_SCHEMAS[schema_name], mimetype="application/json")
+    response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+
+    return response
 
 
 @current_app.errorhandler(Exception)
@@ -36,7 +36,13 @@ tests_require = [
     "stac.py>=0.9.0",
 ]
 
+compression_require = [
+    "Brotli>=1.0",
+    "zstandard>=0.15",
+]
+
 extras_require = {
+    "compression": compression_require,
     "docs": docs_require,
     "tests": tests_require,
 }
@@ -54,6 +60,8 @@ install_requires = [
     "SQLAlchemy>=1.3,<1.4",
     "psycopg2-binary>=2.8.4",
     "packaging>=20.4",
+    "orjson>=3.4",
+    "cachetools>=4.1",
     "bdc-catalog @ git+https://github.com/brazil-data-cube/bdc-catalog@v0.6.4",
     "bdc-auth-client @ git+https://github.com/brazil-data-cube/bdc-auth-client@v0.2.1",
 ]
@@ -5,8 +5,11 @@
 # bdc-stac is a free software; you can redistribute it and/or modify it
 # under the terms of the MIT License; see LICENSE file for more details.
 #
+import gzip
+import json
 import os
 
+import orjson
 import pytest
 import stac
 
@@ -175,3 +178,162 @@ class TestBDCStac:
         response = client.post("/stac/search", content_type="application/json", json=parameters)
 
         assert response.status_code == 400
+        assert response.get_json()["description"] == "'-180,-90,180,a' is not a valid bbox."
+
+    def test_schema(self, client):
+        response = client.get("/schemas/bdc_extension.json")
+
+        assert response.status_code == 200
+        assert response.get_json() is not None
+        assert "immutable" in response.headers["Cache-Control"]
+
+    def test_schema_not_found(self, client):
+        response = client.get("/schemas/wrong_schema.json")
+
+        assert response.status_code == 404
+
+    def test_schema_gzip(self, client):
+        response = client.get("/schemas/bdc_extension.json", headers={"Accept-Encoding": "gzip"})
+
+        assert response.status_code == 200
+        assert response.headers["Content-Encoding"] == "gzip"
+        assert "Accept-Encoding" in response.headers["Vary"]
+        assert json.loads(gzip.decompress(response.data))
+
+    def test_schema_zstd(self, client):
+        zstandard = pytest.importorskip("zstandard")
+
+        response = client.get("/schemas/bdc_extension.json", headers={"Accept-Encoding": "gzip, zstd"})
+
+        assert response.status_code == 200
+        assert response.headers["Content-Encoding"] == "zstd"
+        assert "Accept-Encoding" in response.headers["Vary"]
+        assert json.loads(zstandard.ZstdDecompressor().decompressobj().decompress(response.data))
+
+    def test_schema_encoding_not_accepted(self, client):
+        response = client.get("/schemas/bdc_extension.json", headers={"Accept-Encoding": "gzip;q=0"})
+
+        assert response.status_code == 200
+        assert "Content-Encoding" not in response.headers
+        assert response.get_json() is not None
+
+    def test_collections_cache(self, client):
+        from bdc_stac.data import _collections_cache, get_collections
+
+        client.get("/collections")
+        client.get("/collections/LC8SR")
+
+        with client.application.app_context():
+            collections = get_collections(roles=[])
+
+            assert get_collections(roles=[]) is collections
+            assert all("links" not in collection for collection in collections)
+            assert all("links" not in collection for collection in get_collections("LC8SR", roles=[]))
+
+            assert get_collections("wrong_collection", roles=[]) == []
+            assert ("wrong_collection", frozenset()) not in _collections_cache
+
+    def test_streamed_response_gzip(self, client):
+        from flask import Response
+
+        from bdc_stac.routes import after_request
+
+        chunks = [b'{"features":[', b"1," * 1000 + b"1", b"]}"]
+
+        with client.application.test_request_context(headers={"Accept-Encoding": "gzip"}):
+            response = after_request(Response(iter(chunks), mimetype="application/json"))
+
+            assert response.is_streamed
+            assert response.headers["Content-Encoding"] == "gzip"
+            assert gzip.decompress(b"".join(response.response)) == b"".join(chunks)
+
+    def test_small_response_skips_brotli(self, client):
+        pytest.importorskip("brotli")
+
+        response = client.get("/schemas/bdc_extension.json", headers={"Accept-Encoding": "br, gzip"})
+
+        assert response.status_code == 200
+        assert response.headers["Content-Encoding"] == "gzip"
+        assert json.loads(gzip.decompress(response.data))
+
+    def test_streamed_response_brotli(self, client):
+        brotli = pytest.importorskip("brotli")
+
+        from flask import Response
+
+        from bdc_stac.routes import after_request
+
+        chunks = [b'{"features":[', b"1,", b"1]}"]
+
+        with client.application.test_request_context(headers={"Accept-Encoding": "br, gzip"}):
+            response = after_request(Response(iter(chunks), mimetype="application/json"))
+
+            assert response.is_streamed
+            assert response.headers["Content-Encoding"] == "br"
+            assert brotli.decompress(b"".join(response.response)) == b"".join(chunks)
+
+    @pytest.mark.parametrize(
+        "members",
+        [
+            dict(
+                stac_version="0.9.0", stac_extensions=["checksum", "commons", "context", "eo"], type="FeatureCollection"
+            ),
+            dict(type="FeatureCollection"),
+            dict(),
+        ],
+    )
+    @pytest.mark.parametrize(
+        "features", [[], [{"type": "Feature", "id": "a"}, {"type": "Feature", "id": "b", "properties": {"x": 1}}]]
+    )
+    def test_item_collection_encoder(self, client, members, features):
+        from bdc_stac.encoder import ItemCollectionEncoder, Link
+
+        encoder = ItemCollectionEncoder(**members)
+        links = [Link("http://localhost/search", "self"), {"href": "http://localhost/", "rel": "root"}]
+        context = {"returned": len(features), "limit": 10, "matched": 2}
+
+        expected = {
+            **members,
+            "links": [{"href": "http://localhost/search", "rel": "self"}, {"href": "http://localhost/", "rel": "root"}],
+            "context": context,
+            "features": features,
+        }
+
+        assert orjson.loads(encoder.encode(links, context, features)) == expected
+        assert orjson.loads(b"".join(encoder.iter_encode(links, context, iter(features)))) == expected
+
+    @pytest.mark.parametrize(
+        "query_string,page,expected",
+        [
+            ("page=1&page=2&limit=5", 3, "?limit=5&page=3"),
+            ("limit=5&bbox=-180,-90,180,90", 2, "?limit=5&bbox=-180%2C-90%2C180%2C90&page=2"),
+            ("", None, ""),
+            ("", 2, "?page=2"),
+            ("page=1&limit=5", None, "?page=1&limit=5"),
+        ],
+    )
+    def test_page_href(self, client, query_string, page, expected):
+        from bdc_stac.routes import BASE_URL, _page_href
+
+        with client.application.test_request_context(f"/search?{query_string}"):
+            assert _page_href("/search", page) == f"{BASE_URL}/search{expected}"
+
+    @pytest.mark.parametrize("concurrent_count", [True, False])
+    @pytest.mark.parametrize("page,per_page", [(1, 1), (2, 1), (1, 1000), (1000, 10)])
+    def test_paginate(self, client, concurrent_count, page, per_page):
+        from bdc_catalog.models import Item
+
+        from bdc_stac.data import paginate, session
+
+        with client.application.app_context():
+            query = session.query(Item.id).order_by(Item.id)
+
+            expected = query.paginate(page=page, per_page=per_page, error_out=False)
+            result = paginate(query, page=page, per_page=per_page, concurrent_count=concurrent_count)
+
+            assert result.items == expected.items
+            assert result.total == expected.total
+            assert result.has_next == expected.has_next
+            assert result.has_prev == expected.has_prev
+            assert result.next_num == expected.next_num
+            assert result.prev_num == expected.prev_num